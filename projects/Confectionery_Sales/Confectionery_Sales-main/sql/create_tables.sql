@@ -66,3 +66,9 @@ CREATE INDEX IF NOT EXISTS idx_sales_year ON sales(year);
 CREATE INDEX IF NOT EXISTS idx_sales_product ON sales(product_id);
 CREATE INDEX IF NOT EXISTS idx_products_brand ON products(brand_id);
 CREATE INDEX IF NOT EXISTS idx_market_share_brand_year ON market_share(brand_id, year);
+
+-- Composite indexes for the grouped reporting queries
+CREATE INDEX IF NOT EXISTS idx_sales_product_year ON sales(product_id, year);
+CREATE INDEX IF NOT EXISTS idx_sales_year_region ON sales(year, region);
+CREATE INDEX IF NOT EXISTS idx_sales_year_quarter ON sales(year, quarter);
+CREATE INDEX IF NOT EXISTS idx_products_brand_category ON products(brand_id, category_id);
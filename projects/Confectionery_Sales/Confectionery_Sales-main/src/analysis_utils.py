@@ -5,16 +5,32 @@ Helper functions for data analysis and calculations
 
 import pandas as pd
 import numpy as np
+from pandas.api.types import is_datetime64_any_dtype
 from scipy import stats
 import warnings
+from bisect import bisect_right
 warnings.filterwarnings('ignore')
 
+# Suffix lookup for format_large_numbers, indexed by magnitude bucket
+_MAGNITUDE_THRESHOLDS = (1e3, 1e6, 1e9)
+_MAGNITUDE_DIVISORS = (1.0, 1e3, 1e6, 1e9)
+_MAGNITUDE_SUFFIXES = ('', 'K', 'M', 'B')
+
 class AnalysisUtils:
     """Utility class for sales analysis calculations and data transformations"""
     
     @staticmethod
     def calculate_growth_rate(current_value, previous_value):
-        """Calculate growth rate between two values"""
+        """Calculate growth rate between two values (scalars or arrays)"""
+        if np.ndim(previous_value) > 0:
+            current = np.asarray(current_value, dtype=np.float64)
+            previous = np.asarray(previous_value, dtype=np.float64)
+            valid = (previous != 0) & ~np.isnan(previous)
+            growth = np.divide(current - previous, previous,
+                               out=np.full(np.broadcast(current, previous).shape, np.nan),
+                               where=valid)
+            return growth * 100
+        
         if previous_value == 0 or pd.isna(previous_value):
             return np.nan
         return ((current_value - previous_value) / previous_value) * 100
@@ -29,20 +45,21 @@ class AnalysisUtils:
     @staticmethod
     def add_growth_metrics(df, value_col, time_col, group_cols=None):
         """Add growth rate columns to dataframe"""
-        df = df.copy()
+        # sort_values returns a new frame, so the caller's frame is never mutated
         df = df.sort_values(time_col)
         
         if group_cols:
-            df['prev_value'] = df.groupby(group_cols)[value_col].shift(1)
+            grouped = df.groupby(group_cols, sort=False)[value_col]
+            prev_value = grouped.shift(1)
+            growth_rate = grouped.pct_change(fill_method=None) * 100
         else:
-            df['prev_value'] = df[value_col].shift(1)
+            prev_value = df[value_col].shift(1)
+            growth_rate = df[value_col].pct_change(fill_method=None) * 100
         
-        df['growth_rate'] = df.apply(
-            lambda row: AnalysisUtils.calculate_growth_rate(row[value_col], row['prev_value']), 
-            axis=1
-        )
+        # Match calculate_growth_rate: no growth defined from a zero base
+        df['growth_rate'] = growth_rate.mask(prev_value.eq(0))
         
-        return df.drop('prev_value', axis=1)
+        return df
     
     @staticmethod
     def calculate_market_share(brand_revenue, total_market_revenue):
@@ -54,41 +71,64 @@ class AnalysisUtils:
     @staticmethod
     def get_seasonal_indices(df, date_col, value_col, freq='month'):
         """Calculate seasonal indices for the data"""
-        df = df.copy()
-        df[date_col] = pd.to_datetime(df[date_col])
+        dates = df[date_col]
+        if not is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates)
         
         if freq == 'month':
-            df['period'] = df[date_col].dt.month
+            period = dates.dt.month
+            n_periods = 12
         elif freq == 'quarter':
-            df['period'] = df[date_col].dt.quarter
+            period = dates.dt.quarter
+            n_periods = 4
         else:
             raise ValueError("Frequency must be 'month' or 'quarter'")
         
+        period = period.to_numpy(dtype=np.float64)
+        values = df[value_col].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(period) & ~np.isnan(values)
+        period = period[valid].astype(np.intp) - 1
+        values = values[valid]
+        
         # Calculate average for each period
-        period_avg = df.groupby('period')[value_col].mean()
-        overall_avg = df[value_col].mean()
+        sums = np.bincount(period, weights=values, minlength=n_periods)
+        counts = np.bincount(period, minlength=n_periods)
+        observed = np.flatnonzero(counts)
+        period_avg = sums[observed] / counts[observed]
+        overall_avg = values.mean()
         
         # Calculate seasonal index
         seasonal_index = (period_avg / overall_avg) * 100
         
-        return seasonal_index.to_dict()
+        return dict(zip((observed + 1).tolist(), seasonal_index.tolist()))
     
     @staticmethod
     def perform_trend_analysis(df, time_col, value_col):
         """Perform trend analysis using linear regression"""
-        df = df.copy()
         df = df.sort_values(time_col)
         
         # Convert time to numeric for regression
-        df['time_numeric'] = pd.to_numeric(pd.to_datetime(df[time_col]))
+        time_values = df[time_col]
+        if not is_datetime64_any_dtype(time_values):
+            time_values = pd.to_datetime(time_values)
+        x = time_values.to_numpy().view('i8').astype(np.float64)
+        y = df[value_col].to_numpy(dtype=np.float64)
+        
+        # Closed-form ordinary least squares
+        dx = x - x.mean()
+        dy = y - y.mean()
+        sxx = (dx * dx).sum()
+        syy = (dy * dy).sum()
+        sxy = (dx * dy).sum()
+        slope = sxy / sxx
+        intercept = y.mean() - slope * x.mean()
         
-        # Perform linear regression
-        slope, intercept, r_value, p_value, std_err = stats.linregress(
-            df['time_numeric'], df[value_col]
-        )
+        r_value = min(max(sxy / np.sqrt(sxx * syy), -1.0), 1.0) if syy else 0.0
+        p_value = AnalysisUtils._regression_p_value(r_value, len(x) - 2)
         
         # Calculate trend line
-        df['trend_line'] = slope * df['time_numeric'] + intercept
+        df['time_numeric'] = x
+        df['trend_line'] = slope * x + intercept
         
         trend_info = {
             'slope': slope,
@@ -101,23 +141,40 @@ class AnalysisUtils:
         
         return df, trend_info
     
+    @staticmethod
+    def _regression_p_value(r_value, dof):
+        """Two-sided p-value for the slope of a simple linear regression"""
+        if dof <= 0:
+            return np.nan
+        if abs(r_value) == 1.0:
+            return 0.0
+        t_stat = r_value * np.sqrt(dof / ((1.0 - r_value) * (1.0 + r_value)))
+        return 2 * stats.t.sf(abs(t_stat), dof)
+    
     @staticmethod
     def calculate_concentration_metrics(df, brand_col, value_col):
         """Calculate market concentration metrics"""
-        brand_totals = df.groupby(brand_col)[value_col].sum().sort_values(ascending=False)
+        # Per-brand totals via integer codes instead of a GroupBy object
+        codes, brands = pd.factorize(df[brand_col], sort=False)
+        values = df[value_col].to_numpy(dtype=np.float64)
+        valid = (codes >= 0) & ~np.isnan(values)
+        brand_totals = np.bincount(codes[valid], weights=values[valid], minlength=len(brands))
+        
+        order = np.argsort(-brand_totals, kind='stable')
+        brand_totals = brand_totals[order]
         total_market = brand_totals.sum()
         
         # Market shares
-        market_shares = (brand_totals / total_market * 100).round(2)
+        market_shares = np.round(brand_totals / total_market * 100, 2)
         
         # Herfindahl-Hirschman Index
-        hhi = (market_shares ** 2).sum()
+        hhi = float((market_shares ** 2).sum())
         
         # Top 3 concentration ratio
-        cr3 = market_shares.head(3).sum()
+        cr3 = float(market_shares[:3].sum())
         
         return {
-            'market_shares': market_shares.to_dict(),
+            'market_shares': dict(zip(brands[order], market_shares.tolist())),
             'hhi': hhi,
             'cr3': cr3,
             'market_concentration': 'High' if hhi > 2500 else 'Moderate' if hhi > 1500 else 'Low'
@@ -126,33 +183,38 @@ class AnalysisUtils:
     @staticmethod
     def identify_outliers(df, value_col, method='iqr', threshold=1.5):
         """Identify outliers in the data"""
+        values = df[value_col].to_numpy(dtype=np.float64)
+        
         if method == 'iqr':
-            Q1 = df[value_col].quantile(0.25)
-            Q3 = df[value_col].quantile(0.75)
+            # Both quartiles from a single percentile pass
+            Q1, Q3 = np.nanpercentile(values, [25, 75])
             IQR = Q3 - Q1
             lower_bound = Q1 - threshold * IQR
             upper_bound = Q3 + threshold * IQR
-            outliers = df[(df[value_col] < lower_bound) | (df[value_col] > upper_bound)]
+            mask = (values < lower_bound) | (values > upper_bound)
         elif method == 'zscore':
-            z_scores = np.abs(stats.zscore(df[value_col]))
-            outliers = df[z_scores > threshold]
+            z_scores = np.abs((values - values.mean()) / values.std())
+            mask = z_scores > threshold
         else:
             raise ValueError("Method must be 'iqr' or 'zscore'")
         
-        return outliers
+        return df.iloc[np.flatnonzero(mask)]
     
     @staticmethod
     def calculate_performance_metrics(df, revenue_col, cost_col=None, units_col=None):
         """Calculate various performance metrics"""
         metrics = {}
         
-        # Basic metrics
-        metrics['total_revenue'] = df[revenue_col].sum()
-        metrics['average_revenue'] = df[revenue_col].mean()
-        metrics['median_revenue'] = df[revenue_col].median()
-        metrics['revenue_std'] = df[revenue_col].std()
+        # Basic metrics, computed from a single extraction of the column
+        revenue = df[revenue_col].to_numpy(dtype=np.float64)
+        revenue = revenue[~np.isnan(revenue)]
+        metrics['total_revenue'] = revenue.sum()
+        metrics['average_revenue'] = revenue.mean() if revenue.size else np.nan
+        metrics['median_revenue'] = np.median(revenue) if revenue.size else np.nan
+        metrics['revenue_std'] = revenue.std(ddof=1) if revenue.size > 1 else np.nan
         metrics['revenue_cv'] = metrics['revenue_std'] / metrics['average_revenue']
         
+        # Totals are summed per column so each keeps its own dtype (e.g. integer units)
         if cost_col:
             total_cost = df[cost_col].sum()
             metrics['total_cost'] = total_cost
@@ -168,12 +230,13 @@ class AnalysisUtils:
     @staticmethod
     def create_summary_table(df, group_col, metrics_cols):
         """Create a summary table with key metrics by group"""
-        summary = df.groupby(group_col).agg({
-            col: ['sum', 'mean', 'count'] for col in metrics_cols
+        aggregations = ('sum', 'mean', 'count')
+        summary = df.groupby(group_col, observed=True).agg({
+            col: aggregations for col in metrics_cols
         }).round(2)
         
         # Flatten column names
-        summary.columns = ['_'.join(col).strip() for col in summary.columns.values]
+        summary.columns = summary.columns.map('_'.join)
         
         return summary.reset_index()
     
@@ -183,12 +246,22 @@ class AnalysisUtils:
         brand_metrics = df.groupby(brand_col)[metrics].sum()
         
         correlations = {}
+        if len(metrics) < 2:
+            return correlations
+        
+        # Spearman rank correlation for every metric pair in one call
+        corr_matrix, p_matrix = stats.spearmanr(brand_metrics.to_numpy(), axis=0)
+        if np.ndim(corr_matrix) == 0:
+            # spearmanr returns scalars when given exactly two columns
+            corr_matrix = np.array([[1.0, corr_matrix], [corr_matrix, 1.0]])
+            p_matrix = np.array([[0.0, p_matrix], [p_matrix, 0.0]])
+        
         for i, metric1 in enumerate(metrics):
-            for metric2 in metrics[i+1:]:
-                # Calculate Spearman rank correlation
-                corr, p_value = stats.spearmanr(brand_metrics[metric1], brand_metrics[metric2])
+            for j in range(i + 1, len(metrics)):
+                metric2 = metrics[j]
+                p_value = p_matrix[i, j]
                 correlations[f"{metric1}_vs_{metric2}"] = {
-                    'correlation': corr,
+                    'correlation': corr_matrix[i, j],
                     'p_value': p_value,
                     'significance': 'Significant' if p_value < 0.05 else 'Not Significant'
                 }
@@ -213,14 +286,23 @@ class AnalysisUtils:
     @staticmethod
     def format_large_numbers(value):
         """Format large numbers with appropriate suffixes"""
-        if value >= 1e9:
-            return f"{value/1e9:.1f}B"
-        elif value >= 1e6:
-            return f"{value/1e6:.1f}M"
-        elif value >= 1e3:
-            return f"{value/1e3:.1f}K"
-        else:
+        idx = bisect_right(_MAGNITUDE_THRESHOLDS, value)
+        # NaN compares false against every threshold, so bisect would file it under 'B'
+        if idx == 0 or np.isnan(value):
             return f"{value:.0f}"
+        return f"{value/_MAGNITUDE_DIVISORS[idx]:.1f}{_MAGNITUDE_SUFFIXES[idx]}"
+    
+    @staticmethod
+    def format_large_numbers_array(values):
+        """Format an array of numbers with appropriate suffixes"""
+        values = np.asarray(values, dtype=np.float64)
+        idx = np.digitize(values, _MAGNITUDE_THRESHOLDS)
+        idx[np.isnan(values)] = 0
+        scaled = values / np.take(_MAGNITUDE_DIVISORS, idx)
+        formatted = np.where(idx == 0,
+                             np.char.mod('%.0f', scaled),
+                             np.char.mod('%.1f', scaled))
+        return np.char.add(formatted, np.take(_MAGNITUDE_SUFFIXES, idx))
 
 # Example usage and testing functions
 def test_analysis_utils():
@@ -6,14 +6,22 @@ Generates realistic sample sales data for Orion Food Vina, Kido, and Kinh Do bra
 import pandas as pd
 import numpy as np
 import sqlite3
-import random
+import calendar
 from datetime import datetime, timedelta
 from pathlib import Path
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow is optional; pandas' CSV writer is used without it
+    pa = None
+
+
 class ConfectionerySalesDataGenerator:
-    def __init__(self, start_year=2010, end_year=2020):
+    def __init__(self, start_year=2010, end_year=2020, seed=None):
         self.start_year = start_year
         self.end_year = end_year
+        self.rng = np.random.default_rng(seed)
         self.brands = {
             1: {'name': 'Orion Food Vina', 'code': 'OFV', 'base_growth': 0.12},
             2: {'name': 'Kido', 'code': 'KDO', 'base_growth': 0.08}, 
@@ -41,114 +49,161 @@ class ConfectionerySalesDataGenerator:
         self.regions = ['North', 'Central', 'South']
         self.sales_channels = ['Supermarket', 'Convenience Store', 'Traditional Market', 'Online']
         
+    def _build_factor_tables(self):
+        """Tabulate growth by (year offset, brand) and seasonality by (month, product)"""
+        years_from_start = np.arange(self.end_year - self.start_year + 1)
+        base_growth = np.array([brand['base_growth'] for brand in self.brands.values()])
+        growth_table = (1 + base_growth[None, :]) ** years_from_start[:, None]
+        
+        # Higher sales in Q4, post-holiday decline in Jan/Feb; row 0 is unused
+        month_factor = np.ones(13)
+        month_factor[[10, 11, 12]] = 1.4
+        month_factor[[1, 2]] = 0.7
+        seasonality = np.array([product['seasonality'] for product in self.products.values()])
+        seasonal_table = month_factor[:, None] * seasonality[None, :]
+        
+        return growth_table, seasonal_table
+    
     def generate_sales_data(self, num_records=50000):
         """Generate sales data for the specified period"""
-        sales_data = []
-        
-        for year in range(self.start_year, self.end_year + 1):
-            for month in range(1, 13):
-                for product_id, product_info in self.products.items():
-                    brand_info = self.brands[product_info['brand_id']]
-                    
-                    # Calculate number of sales transactions for this product/month
-                    base_transactions = random.randint(50, 200)
-                    
-                    # Apply growth trend
-                    years_from_start = year - self.start_year
-                    growth_factor = (1 + brand_info['base_growth']) ** years_from_start
-                    
-                    # Apply seasonality (higher sales in Q4 for most products)
-                    seasonal_factor = product_info['seasonality']
-                    if month in [10, 11, 12]:  # Q4 seasonal boost
-                        seasonal_factor *= 1.4
-                    elif month in [1, 2]:  # Post-holiday decline
-                        seasonal_factor *= 0.7
-                        
-                    transactions = int(base_transactions * growth_factor * seasonal_factor)
-                    
-                    for _ in range(transactions):
-                        # Generate random sale date within the month
-                        days_in_month = 28 if month == 2 else 30 if month in [4,6,9,11] else 31
-                        day = random.randint(1, days_in_month)
-                        sale_date = f"{year}-{month:02d}-{day:02d}"
-                        
-                        # Generate units sold (varying by transaction)
-                        units_sold = random.randint(1, 10)
-                        
-                        # Calculate price with some variation
-                        unit_price = product_info['base_price'] * random.uniform(0.9, 1.1)
-                        revenue = units_sold * unit_price
-                        
-                        # Calculate costs and profit
-                        cost_percentage = random.uniform(0.6, 0.75)
-                        cost_of_goods = revenue * cost_percentage
-                        profit = revenue - cost_of_goods
-                        
-                        # Assign random region and sales channel
-                        region = random.choice(self.regions)
-                        sales_channel = random.choice(self.sales_channels)
-                        
-                        quarter = (month - 1) // 3 + 1
-                        
-                        sales_data.append({
-                            'product_id': product_id,
-                            'sale_date': sale_date,
-                            'year': year,
-                            'month': month,
-                            'quarter': quarter,
-                            'units_sold': units_sold,
-                            'revenue': round(revenue, 2),
-                            'cost_of_goods': round(cost_of_goods, 2),
-                            'profit': round(profit, 2),
-                            'region': region,
-                            'sales_channel': sales_channel
-                        })
-        
-        return pd.DataFrame(sales_data)
+        rng = self.rng
+        
+        # Per-product attributes as arrays, indexed by product position
+        product_ids = np.array(list(self.products.keys()), dtype=np.int32)
+        base_prices = np.array([p['base_price'] for p in self.products.values()], dtype=np.float64)
+        brand_index = {brand_id: i for i, brand_id in enumerate(self.brands)}
+        product_brand = np.array([brand_index[p['brand_id']] for p in self.products.values()])
+        growth_table, seasonal_table = self._build_factor_tables()
+        
+        # One cell per (year, month, product), in the original iteration order
+        years = np.arange(self.start_year, self.end_year + 1, dtype=np.int32)
+        months = np.arange(1, 13, dtype=np.int8)
+        cell_year, cell_month, cell_product = (
+            grid.ravel() for grid in np.meshgrid(years, months, np.arange(len(product_ids)), indexing='ij')
+        )
+        
+        # Calculate number of sales transactions for each product/month
+        base_transactions = rng.integers(50, 201, size=cell_year.size)
+        
+        # Apply growth trend and seasonality via table lookups
+        growth_factor = growth_table[cell_year - self.start_year, product_brand[cell_product]]
+        seasonal_factor = seasonal_table[cell_month, cell_product]
+        
+        transactions = (base_transactions * growth_factor * seasonal_factor).astype(np.int64)
+        
+        # Expand each cell to one row per transaction
+        product_idx = np.repeat(cell_product, transactions)
+        year = np.repeat(cell_year, transactions)
+        month = np.repeat(cell_month, transactions)
+        total = product_idx.size
+        
+        # Generate random sale date within the month (leap-year aware)
+        days_in_month = np.array([
+            [calendar.monthrange(y, m)[1] for m in months] for y in years
+        ])
+        day = rng.integers(1, days_in_month[year - self.start_year, month - 1] + 1)
+        sale_date = pd.to_datetime({'year': year, 'month': month, 'day': day})
+        
+        # Generate units sold and price with some variation, then costs and profit
+        revenue = base_prices[product_idx]
+        units_sold = rng.integers(1, 11, size=total, dtype=np.int32)
+        revenue *= rng.uniform(0.9, 1.1, size=total)
+        revenue *= units_sold
+        cost_of_goods = revenue * rng.uniform(0.6, 0.75, size=total)
+        profit = revenue - cost_of_goods
+        for column in (revenue, cost_of_goods, profit):
+            np.round(column, 2, out=column)
+        
+        # Assign random region and sales channel as category codes
+        region = pd.Categorical.from_codes(
+            rng.integers(0, len(self.regions), size=total), categories=self.regions)
+        sales_channel = pd.Categorical.from_codes(
+            rng.integers(0, len(self.sales_channels), size=total), categories=self.sales_channels)
+        
+        return pd.DataFrame({
+            'product_id': product_ids[product_idx],
+            'sale_date': sale_date.to_numpy(),
+            'year': year,
+            'month': month,
+            'quarter': (month - 1) // 3 + 1,
+            'units_sold': units_sold,
+            'revenue': revenue,
+            'cost_of_goods': cost_of_goods,
+            'profit': profit,
+            'region': region,
+            'sales_channel': sales_channel
+        }, copy=False)
     
     def generate_market_share_data(self):
         """Generate market share data for each brand by year"""
-        market_share_data = []
+        rng = self.rng
         
         # Base market shares (approximated)
         base_shares = {1: 35, 2: 30, 3: 25}  # Remaining 10% for other brands
+        brand_ids = np.array(list(base_shares.keys()), dtype=np.int32)
+        brand_shares = np.array(list(base_shares.values()), dtype=np.float64)
         
-        for year in range(self.start_year, self.end_year + 1):
-            total_market_size = 1000000000 * (1.08 ** (year - self.start_year))  # 8% annual market growth
-            
-            for brand_id, base_share in base_shares.items():
-                # Add some variation to market share over time
-                share_variation = random.uniform(-2, 2)
-                market_share = base_share + share_variation
-                brand_revenue = total_market_size * (market_share / 100)
-                
-                for quarter in range(1, 5):
-                    quarterly_variation = random.uniform(0.8, 1.2)
-                    quarterly_share = market_share * quarterly_variation
-                    quarterly_revenue = brand_revenue / 4 * quarterly_variation
-                    
-                    market_share_data.append({
-                        'brand_id': brand_id,
-                        'year': year,
-                        'quarter': quarter,
-                        'market_share_percentage': round(quarterly_share, 2),
-                        'total_market_size': round(total_market_size, 2),
-                        'brand_revenue': round(quarterly_revenue, 2)
-                    })
-        
-        return pd.DataFrame(market_share_data)
+        years = np.arange(self.start_year, self.end_year + 1, dtype=np.int32)
+        quarters = np.arange(1, 5, dtype=np.int8)
+        n_years, n_brands, n_quarters = len(years), len(brand_ids), len(quarters)
+        
+        # 8% annual market growth, one value per year
+        total_market_size = 1000000000 * (1.08 ** (years - self.start_year))
+        
+        # Add some variation to market share over time, one draw per (year, brand)
+        market_share = brand_shares + rng.uniform(-2, 2, size=(n_years, n_brands))
+        brand_revenue = total_market_size[:, None] * (market_share / 100)
+        
+        # Quarterly variation, one draw per (year, brand, quarter)
+        quarterly_variation = rng.uniform(0.8, 1.2, size=(n_years, n_brands, n_quarters))
+        quarterly_share = market_share[:, :, None] * quarterly_variation
+        quarterly_revenue = brand_revenue[:, :, None] / 4 * quarterly_variation
+        
+        shape = (n_years, n_brands, n_quarters)
+        return pd.DataFrame({
+            'brand_id': np.broadcast_to(brand_ids[None, :, None], shape).ravel(),
+            'year': np.broadcast_to(years[:, None, None], shape).ravel(),
+            'quarter': np.broadcast_to(quarters[None, None, :], shape).ravel(),
+            'market_share_percentage': np.round(quarterly_share, 2).ravel(),
+            'total_market_size': np.round(np.broadcast_to(total_market_size[:, None, None], shape), 2).ravel(),
+            'brand_revenue': np.round(quarterly_revenue, 2).ravel()
+        })
     
     def save_to_csv(self, sales_df, market_share_df):
         """Save generated data to CSV files"""
         data_dir = Path('data/sample_data')
         data_dir.mkdir(parents=True, exist_ok=True)
         
-        sales_df.to_csv(data_dir / 'sales_data.csv', index=False)
-        market_share_df.to_csv(data_dir / 'market_share_data.csv', index=False)
+        self._write_csv(sales_df, data_dir / 'sales_data.csv')
+        self._write_csv(market_share_df, data_dir / 'market_share_data.csv')
         
         print(f"Sales data saved: {len(sales_df)} records")
         print(f"Market share data saved: {len(market_share_df)} records")
     
+    @staticmethod
+    def _write_csv(df, path):
+        """Write a dataframe to CSV, using pyarrow's multithreaded writer when available"""
+        if pa is None:
+            df.to_csv(path, index=False)
+            return
+        
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        for i, field in enumerate(table.schema):
+            # Generated dates are whole days; keep them as YYYY-MM-DD
+            if pa.types.is_timestamp(field.type):
+                table = table.set_column(i, field.name, table.column(i).cast(pa.date32()))
+        # Match pandas' layout: no quotes around names or plain strings. pyarrow always quotes
+        # the header and, by default, every string, so write the header here and disable quoting.
+        # Whole-number floats still come out without pandas' trailing '.0' (30932 vs 30932.0)
+        options = pa_csv.WriteOptions(include_header=False, quoting_style='none')
+        try:
+            with pa.OSFile(str(path), 'wb') as sink:
+                sink.write((','.join(table.column_names) + '\n').encode())
+                pa_csv.write_csv(table, sink, options)
+        except pa.ArrowInvalid:
+            # Some value holds a delimiter, quote or newline; pandas quotes just those fields
+            df.to_csv(path, index=False)
+    
     def save_to_database(self, sales_df, market_share_df, db_path='data/confectionery_sales.db'):
         """Save generated data to SQLite database"""
         conn = sqlite3.connect(db_path)
@@ -163,13 +218,34 @@ class ConfectionerySalesDataGenerator:
             data_sql = f.read()
         conn.executescript(data_sql)
         
-        # Insert generated data
-        sales_df.to_sql('sales', conn, if_exists='append', index=False)
-        market_share_df.to_sql('market_share', conn, if_exists='append', index=False)
+        # Bulk-load generated data in a single transaction
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("BEGIN")
+        self._insert_rows(conn, 'sales', sales_df)
+        self._insert_rows(conn, 'market_share', market_share_df)
+        conn.commit()
         
         conn.close()
         print(f"Data saved to database: {db_path}")
 
+    @staticmethod
+    def _insert_rows(conn, table, df):
+        """Insert all dataframe rows into a table with one executemany call"""
+        columns = []
+        for col in df.columns:
+            values = df[col]
+            if pd.api.types.is_datetime64_any_dtype(values):
+                values = values.dt.strftime('%Y-%m-%d')
+            # tolist() yields native Python scalars that sqlite3 can bind
+            columns.append(values.tolist())
+        
+        placeholders = ','.join('?' * len(df.columns))
+        conn.executemany(
+            f"INSERT INTO {table} ({','.join(df.columns)}) VALUES ({placeholders})",
+            zip(*columns)
+        )
+
 def main():
     """Main function to generate and save data"""
     print("Generating confectionery sales data (2010-2020)...")
@@ -9,6 +9,12 @@ from pathlib import Path
 import logging
 
 class DatabaseManager:
+    CONNECTION_PRAGMAS = (
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA cache_size=-200000",
+        "PRAGMA temp_store=MEMORY",
+    )
+    
     def __init__(self, db_path='data/confectionery_sales.db'):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
@@ -17,7 +23,12 @@ class DatabaseManager:
     def connect(self):
         """Establish database connection"""
         try:
-            self.connection = sqlite3.connect(self.db_path)
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            
+            # Tune the connection for the read-heavy reporting workload
+            for pragma in self.CONNECTION_PRAGMAS:
+                self.connection.execute(pragma)
+            
             logging.info(f"Connected to database: {self.db_path}")
             return self.connection
         except sqlite3.Error as e:
@@ -233,18 +244,23 @@ class DatabaseManager:
         """Generate summary statistics for the dataset"""
         stats = {}
         
-        # Basic counts
-        stats['total_sales_records'] = self.execute_query("SELECT COUNT(*) as count FROM sales").iloc[0]['count']
-        stats['total_products'] = self.execute_query("SELECT COUNT(*) as count FROM products").iloc[0]['count']
-        stats['total_brands'] = self.execute_query("SELECT COUNT(*) as count FROM brands").iloc[0]['count']
-        
-        # Date range
-        date_range = self.execute_query("SELECT MIN(year) as min_year, MAX(year) as max_year FROM sales")
-        stats['date_range'] = f"{date_range.iloc[0]['min_year']}-{date_range.iloc[0]['max_year']}"
+        # Counts, date range and revenue totals in a single round-trip
+        summary = self.execute_query("""
+        SELECT 
+            COUNT(*) as total_sales_records,
+            (SELECT COUNT(*) FROM products) as total_products,
+            (SELECT COUNT(*) FROM brands) as total_brands,
+            MIN(year) as min_year,
+            MAX(year) as max_year,
+            SUM(revenue) as total_revenue
+        FROM sales
+        """).to_dict('records')[0]
         
-        # Revenue totals
-        revenue_total = self.execute_query("SELECT SUM(revenue) as total FROM sales")
-        stats['total_revenue'] = revenue_total.iloc[0]['total']
+        stats['total_sales_records'] = summary['total_sales_records']
+        stats['total_products'] = summary['total_products']
+        stats['total_brands'] = summary['total_brands']
+        stats['date_range'] = f"{summary['min_year']}-{summary['max_year']}"
+        stats['total_revenue'] = summary['total_revenue']
         
         return stats
 
@@ -3,14 +3,16 @@ Visualization Module for Confectionery Sales Analysis
 Functions for creating charts and graphs for sales performance analysis
 """
 
+import os
+import matplotlib
 import matplotlib.pyplot as plt
 import seaborn as sns
 import plotly.express as px
-import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -18,6 +20,60 @@ warnings.filterwarnings('ignore')
 plt.style.use('seaborn-v0_8')
 sns.set_palette("husl")
 
+def _lttb_indices(x, y, n_out):
+    """Positions of the points kept by Largest-Triangle-Three-Buckets downsampling"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    
+    # First and last points are always kept; the rest is split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    selected = np.empty(n_out, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        
+        # Keep the point forming the largest triangle with the previous pick and next average
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) -
+                      (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    
+    return selected
+
+def _brand_pivot(df, values):
+    """Year x brand pivot with brands in order of first appearance, so colors and legend order follow the data"""
+    pivot = df.pivot(index='year', columns='brand_name', values=values)
+    return pivot.reindex(columns=df['brand_name'].unique())
+
+def _downsample_series(pivot, max_points):
+    """Yield (column, x, y) per pivot column, LTTB-reduced to at most max_points non-NaN points"""
+    if isinstance(pivot.index, pd.DatetimeIndex):
+        x = pivot.index.asi8.astype(np.float64)
+    elif pd.api.types.is_numeric_dtype(pivot.index):
+        x = pivot.index.to_numpy(dtype=np.float64)
+    else:
+        x = np.arange(len(pivot), dtype=np.float64)
+    
+    for col in pivot.columns:
+        y = pivot[col].to_numpy(dtype=np.float64)
+        valid = np.flatnonzero(~np.isnan(y))
+        if max_points is not None:
+            valid = valid[_lttb_indices(x[valid], y[valid], max_points)]
+        yield col, pivot.index[valid], y[valid]
+
+def _downsample_long(pivot, max_points):
+    """Downsampled pivot columns stacked into a long frame for Plotly Express"""
+    index_name, column_name = pivot.index.name, pivot.columns.name
+    return pd.concat([pd.DataFrame({index_name: x, 'value': y, column_name: col})
+                      for col, x, y in _downsample_series(pivot, max_points)],
+                     ignore_index=True)
+
 class SalesVisualization:
     """Class for creating various sales analysis visualizations"""
     
@@ -26,15 +82,17 @@ class SalesVisualization:
         self.dpi = dpi
         self.colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b']
         
-    def plot_revenue_trend(self, df, save_path=None):
+    def _plot_brand_lines(self, ax, pivot, marker, max_points=None):
+        """Plot one line per brand from a year x brand pivot, each with at most max_points points"""
+        for i, (brand, x, y) in enumerate(_downsample_series(pivot, max_points)):
+            ax.plot(x, y, marker=marker, linewidth=2, label=brand, color=self.colors[i])
+    
+    def plot_revenue_trend(self, df, save_path=None, max_points=2000):
         """Plot revenue trend by brand over years"""
-        fig, ax = plt.subplots(figsize=self.figsize, dpi=self.dpi)
+        fig, ax = plt.subplots(figsize=self.figsize, dpi=self.dpi, layout='constrained')
         
-        brands = df['brand_name'].unique()
-        for i, brand in enumerate(brands):
-            brand_data = df[df['brand_name'] == brand]
-            ax.plot(brand_data['year'], brand_data['total_revenue'], 
-                   marker='o', linewidth=2, label=brand, color=self.colors[i])
+        pivot = _brand_pivot(df, 'total_revenue')
+        self._plot_brand_lines(ax, pivot, marker='o', max_points=max_points)
         
         ax.set_xlabel('Year', fontsize=12)
         ax.set_ylabel('Total Revenue (VND)', fontsize=12)
@@ -45,8 +103,6 @@ class SalesVisualization:
         # Format y-axis to show values in billions
         ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/1e9:.1f}B'))
         
-        plt.tight_layout()
-        
         if save_path:
             plt.savefig(save_path, bbox_inches='tight')
         
@@ -54,13 +110,10 @@ class SalesVisualization:
     
     def plot_market_share(self, df, save_path=None):
         """Plot market share evolution over time"""
-        fig, ax = plt.subplots(figsize=self.figsize, dpi=self.dpi)
+        fig, ax = plt.subplots(figsize=self.figsize, dpi=self.dpi, layout='constrained')
         
-        brands = df['brand_name'].unique()
-        for i, brand in enumerate(brands):
-            brand_data = df[df['brand_name'] == brand]
-            ax.plot(brand_data['year'], brand_data['avg_market_share'], 
-                   marker='s', linewidth=2, label=brand, color=self.colors[i])
+        pivot = _brand_pivot(df, 'avg_market_share')
+        self._plot_brand_lines(ax, pivot, marker='s')
         
         ax.set_xlabel('Year', fontsize=12)
         ax.set_ylabel('Market Share (%)', fontsize=12)
@@ -69,8 +122,6 @@ class SalesVisualization:
         ax.grid(True, alpha=0.3)
         ax.set_ylim(0, max(df['avg_market_share']) * 1.1)
         
-        plt.tight_layout()
-        
         if save_path:
             plt.savefig(save_path, bbox_inches='tight')
         
@@ -78,7 +129,7 @@ class SalesVisualization:
     
     def plot_seasonal_patterns(self, df, save_path=None):
         """Plot seasonal sales patterns by quarter"""
-        fig, ax = plt.subplots(figsize=self.figsize, dpi=self.dpi)
+        fig, ax = plt.subplots(figsize=self.figsize, dpi=self.dpi, layout='constrained')
         
         pivot_data = df.pivot(index='quarter', columns='brand_name', values='avg_quarterly_revenue')
         pivot_data.plot(kind='bar', ax=ax, color=self.colors[:len(pivot_data.columns)])
@@ -92,8 +143,6 @@ class SalesVisualization:
         # Format y-axis
         ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/1e6:.0f}M'))
         
-        plt.tight_layout()
-        
         if save_path:
             plt.savefig(save_path, bbox_inches='tight')
         
@@ -101,29 +150,36 @@ class SalesVisualization:
     
     def plot_product_performance(self, df, top_n=10, save_path=None):
         """Plot top performing products by revenue"""
-        top_products = df.nlargest(top_n, 'total_revenue')
+        # Partial selection of the top N rows, then sort only those
+        revenue = df['total_revenue'].to_numpy(dtype=np.float64)
+        candidates = np.flatnonzero(~np.isnan(revenue))
+        n = min(top_n, candidates.size)
+        top_idx = candidates[np.argpartition(-revenue[candidates], n - 1)[:n]] if n else candidates
+        top_idx = top_idx[np.argsort(-revenue[top_idx], kind='stable')]
+        top_products = df.iloc[top_idx]
         
-        fig, ax = plt.subplots(figsize=(14, 8), dpi=self.dpi)
+        fig, ax = plt.subplots(figsize=(14, 8), dpi=self.dpi, layout='constrained')
         
-        bars = ax.barh(range(len(top_products)), top_products['total_revenue'], 
-                      color=plt.cm.viridis(np.linspace(0, 1, len(top_products))))
+        ax.barh(range(len(top_products)), top_products['total_revenue'], 
+               color=plt.cm.viridis(np.linspace(0, 1, len(top_products))))
         
         ax.set_yticks(range(len(top_products)))
-        ax.set_yticklabels([f"{row['brand_name']}\n{row['product_name']}" 
-                           for _, row in top_products.iterrows()])
+        labels = (top_products['brand_name'].astype(str) + '\n' +
+                  top_products['product_name'].astype(str)).tolist()
+        ax.set_yticklabels(labels)
         ax.set_xlabel('Total Revenue (VND)', fontsize=12)
         ax.set_title(f'Top {top_n} Products by Revenue (2010-2020)', fontsize=14, fontweight='bold')
         
         # Add value labels on bars
-        for i, bar in enumerate(bars):
-            width = bar.get_width()
-            ax.text(width, bar.get_y() + bar.get_height()/2, 
+        # Bars are center-aligned on their integer positions
+        widths = top_products['total_revenue'].to_numpy()
+        centers = np.arange(len(widths))
+        for width, center in zip(widths, centers):
+            ax.text(width, center, 
                    f'{width/1e9:.1f}B', ha='left', va='center', fontsize=10)
         
         ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/1e9:.1f}B'))
         
-        plt.tight_layout()
-        
         if save_path:
             plt.savefig(save_path, bbox_inches='tight')
         
@@ -131,7 +187,7 @@ class SalesVisualization:
     
     def plot_category_analysis(self, df, save_path=None):
         """Plot category performance analysis"""
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 8), dpi=self.dpi)
+        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 8), dpi=self.dpi, layout='constrained')
         
         # Revenue by category (stacked bar)
         pivot_revenue = df.pivot(index='brand_name', columns='category_name', values='total_revenue')
@@ -147,25 +203,19 @@ class SalesVisualization:
         ax2.pie(category_totals.values, labels=category_totals.index, autopct='%1.1f%%')
         ax2.set_title('Market Share by Category', fontsize=14, fontweight='bold')
         
-        plt.tight_layout()
-        
         if save_path:
             plt.savefig(save_path, bbox_inches='tight')
         
         return fig
     
-    def plot_growth_analysis(self, df, save_path=None):
+    def plot_growth_analysis(self, df, save_path=None, max_points=2000):
         """Plot year-over-year growth analysis"""
-        # Filter out NaN growth rates
-        df_clean = df.dropna(subset=['yoy_growth_rate'])
+        # Filter out NaN growth rates (e.g. the first year)
+        pivot = _brand_pivot(df.dropna(subset=['yoy_growth_rate']), 'yoy_growth_rate')
         
-        fig, ax = plt.subplots(figsize=self.figsize, dpi=self.dpi)
+        fig, ax = plt.subplots(figsize=self.figsize, dpi=self.dpi, layout='constrained')
         
-        brands = df_clean['brand_name'].unique()
-        for i, brand in enumerate(brands):
-            brand_data = df_clean[df_clean['brand_name'] == brand]
-            ax.plot(brand_data['year'], brand_data['yoy_growth_rate'], 
-                   marker='o', linewidth=2, label=brand, color=self.colors[i])
+        self._plot_brand_lines(ax, pivot, marker='o', max_points=max_points)
         
         ax.axhline(y=0, color='black', linestyle='--', alpha=0.5)
         ax.set_xlabel('Year', fontsize=12)
@@ -174,8 +224,6 @@ class SalesVisualization:
         ax.legend()
         ax.grid(True, alpha=0.3)
         
-        plt.tight_layout()
-        
         if save_path:
             plt.savefig(save_path, bbox_inches='tight')
         
@@ -183,7 +231,7 @@ class SalesVisualization:
     
     def plot_regional_performance(self, df, save_path=None):
         """Plot regional sales performance"""
-        fig, ax = plt.subplots(figsize=self.figsize, dpi=self.dpi)
+        fig, ax = plt.subplots(figsize=self.figsize, dpi=self.dpi, layout='constrained')
         
         pivot_data = df.pivot(index='region', columns='brand_name', values='total_revenue')
         pivot_data.plot(kind='bar', ax=ax, color=self.colors[:len(pivot_data.columns)])
@@ -196,14 +244,12 @@ class SalesVisualization:
         
         ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x/1e9:.1f}B'))
         
-        plt.tight_layout()
-        
         if save_path:
             plt.savefig(save_path, bbox_inches='tight')
         
         return fig
     
-    def create_interactive_dashboard(self, revenue_df, market_share_df, save_path=None):
+    def create_interactive_dashboard(self, revenue_df, market_share_df, save_path=None, max_points=2000):
         """Create interactive Plotly dashboard"""
         fig = make_subplots(
             rows=2, cols=2,
@@ -213,33 +259,27 @@ class SalesVisualization:
                    [{"secondary_y": False}, {"secondary_y": False}]]
         )
         
-        # Revenue trend
-        brands = revenue_df['brand_name'].unique()
-        for brand in brands:
-            brand_data = revenue_df[revenue_df['brand_name'] == brand]
-            fig.add_trace(
-                go.Scatter(x=brand_data['year'], y=brand_data['total_revenue'],
-                          mode='lines+markers', name=f'{brand} Revenue'),
-                row=1, col=1
-            )
+        # Revenue trend, one long-form call for all brands; the pivot is reused below
+        revenue_pivot = _brand_pivot(revenue_df, 'total_revenue')
+        revenue_long = _downsample_long(revenue_pivot, max_points)
+        for trace in px.line(revenue_long, x='year', y='value', color='brand_name', markers=True).data:
+            trace.name = f'{trace.name} Revenue'
+            fig.add_trace(trace, row=1, col=1)
         
         # Market share evolution
-        for brand in brands:
-            if brand in market_share_df['brand_name'].values:
-                brand_data = market_share_df[market_share_df['brand_name'] == brand]
-                fig.add_trace(
-                    go.Scatter(x=brand_data['year'], y=brand_data['avg_market_share'],
-                              mode='lines+markers', name=f'{brand} Market Share'),
-                    row=1, col=2
-                )
+        share_pivot = _brand_pivot(market_share_df, 'avg_market_share')
+        share_brands = revenue_pivot.columns.intersection(share_pivot.columns, sort=False)
+        share_long = _downsample_long(share_pivot[share_brands], max_points)
+        for trace in px.line(share_long, x='year', y='value', color='brand_name', markers=True).data:
+            trace.name = f'{trace.name} Market Share'
+            fig.add_trace(trace, row=1, col=2)
         
         # Total revenue comparison (bar chart)
-        total_revenue_by_brand = revenue_df.groupby('brand_name')['total_revenue'].sum()
-        fig.add_trace(
-            go.Bar(x=total_revenue_by_brand.index, y=total_revenue_by_brand.values,
-                   name='Total Revenue'),
-            row=2, col=1
-        )
+        total_revenue_by_brand = revenue_pivot.sum(axis=0).sort_index()
+        revenue_bar = px.bar(x=total_revenue_by_brand.index, y=total_revenue_by_brand.values).data[0]
+        revenue_bar.name = 'Total Revenue'
+        revenue_bar.showlegend = True
+        fig.add_trace(revenue_bar, row=2, col=1)
         
         fig.update_layout(height=800, showlegend=True, 
                          title_text="Confectionery Sales Dashboard")
@@ -253,77 +293,86 @@ class SalesVisualization:
         """Plot correlation heatmap of different metrics"""
         correlation_matrix = df[metrics_cols].corr()
         
-        fig, ax = plt.subplots(figsize=(10, 8), dpi=self.dpi)
+        fig, ax = plt.subplots(figsize=(10, 8), dpi=self.dpi, layout='constrained')
         
         sns.heatmap(correlation_matrix, annot=True, cmap='RdBu_r', center=0,
                    square=True, ax=ax, cbar_kws={'shrink': .8})
         
         ax.set_title('Correlation Matrix of Sales Metrics', fontsize=14, fontweight='bold')
         
-        plt.tight_layout()
-        
         if save_path:
             plt.savefig(save_path, bbox_inches='tight')
         
         return fig
     
-    def save_all_plots(self, data_dict, output_dir='reports/charts'):
-        """Save all plots to specified directory"""
+    def save_all_plots(self, data_dict, output_dir='reports/charts', workers=1):
+        """Save all plots to specified directory, rendering in up to `workers` processes"""
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
         
-        plots_created = []
-        
-        # Revenue trend
-        if 'revenue_trend' in data_dict:
-            fig = self.plot_revenue_trend(data_dict['revenue_trend'])
-            save_path = output_path / 'revenue_trend.png'
-            fig.savefig(save_path, bbox_inches='tight')
-            plots_created.append(str(save_path))
-            plt.close(fig)
-        
-        # Market share
-        if 'market_share' in data_dict:
-            fig = self.plot_market_share(data_dict['market_share'])
-            save_path = output_path / 'market_share.png'
-            fig.savefig(save_path, bbox_inches='tight')
-            plots_created.append(str(save_path))
-            plt.close(fig)
-        
-        # Seasonal patterns
-        if 'seasonal' in data_dict:
-            fig = self.plot_seasonal_patterns(data_dict['seasonal'])
-            save_path = output_path / 'seasonal_patterns.png'
-            fig.savefig(save_path, bbox_inches='tight')
-            plots_created.append(str(save_path))
-            plt.close(fig)
-        
-        # Product performance
-        if 'product_performance' in data_dict:
-            fig = self.plot_product_performance(data_dict['product_performance'])
-            save_path = output_path / 'product_performance.png'
-            fig.savefig(save_path, bbox_inches='tight')
-            plots_created.append(str(save_path))
-            plt.close(fig)
+        # Output file and plotting method for each chart type present
+        charts = [
+            ('revenue_trend', 'revenue_trend.png', 'plot_revenue_trend'),
+            ('market_share', 'market_share.png', 'plot_market_share'),
+            ('seasonal', 'seasonal_patterns.png', 'plot_seasonal_patterns'),
+            ('product_performance', 'product_performance.png', 'plot_product_performance'),
+        ]
+        jobs = [(method, data_dict[key], output_path / filename)
+                for key, filename, method in charts if key in data_dict]
+        if not jobs:
+            return []
+        
+        max_workers = min(len(jobs), workers, os.cpu_count() or 1)
+        if max_workers <= 1:
+            # A handful of small charts renders faster than worker processes start up
+            return [_render_plot(type(self), self.figsize, self.dpi, method, df, save_path)
+                    for method, df, save_path in jobs]
+        
+        # Charts are independent, so render and PNG-encode them in parallel
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_render_worker) as executor:
+            futures = [
+                executor.submit(_render_plot, type(self), self.figsize, self.dpi, method, df, save_path)
+                for method, df, save_path in jobs
+            ]
+            plots_created = [future.result() for future in futures]
         
         return plots_created
 
+def _init_render_worker():
+    """Make sure worker processes render off-screen"""
+    matplotlib.use('Agg')
+
+def _render_plot(viz_class, figsize, dpi, method, df, save_path):
+    """Build one chart and save it as PNG; also the entry point for render workers"""
+    viz = viz_class(figsize=figsize, dpi=dpi)
+    fig = getattr(viz, method)(df)
+    # Constrained layout already fits labels and legends inside the figure, so save_all_plots
+    # skips bbox_inches='tight' and its extra draw pass; PNGs come out at the full figsize
+    fig.savefig(save_path)
+    plt.close(fig)
+    return str(save_path)
+
 # Example usage
 def demo_visualization():
     """Demonstrate visualization capabilities with sample data"""
-    # Create sample data
-    years = list(range(2010, 2021))
-    brands = ['Orion Food Vina', 'Kido', 'Kinh Do']
+    # Create sample data as a brand x year grid
+    rng = np.random.default_rng(0)
+    years = np.arange(2010, 2021)
+    brands = np.array(['Orion Food Vina', 'Kido', 'Kinh Do'])
+    brand_grid, year_grid = np.meshgrid(brands, years, indexing='ij')
+    brand_col, year_col = brand_grid.ravel(), year_grid.ravel()
     
-    sample_revenue = pd.DataFrame([
-        {'brand_name': brand, 'year': year, 'total_revenue': np.random.uniform(1e9, 5e9)}
-        for brand in brands for year in years
-    ])
+    sample_revenue = pd.DataFrame({
+        'brand_name': brand_col,
+        'year': year_col,
+        'total_revenue': rng.uniform(1e9, 5e9, size=brand_col.size)
+    })
     
-    sample_market_share = pd.DataFrame([
-        {'brand_name': brand, 'year': year, 'avg_market_share': np.random.uniform(20, 40)}
-        for brand in brands for year in years
-    ])
+    sample_market_share = pd.DataFrame({
+        'brand_name': brand_col,
+        'year': year_col,
+        'avg_market_share': rng.uniform(20, 40, size=brand_col.size)
+    })
     
     # Create visualizations
     viz = SalesVisualization()
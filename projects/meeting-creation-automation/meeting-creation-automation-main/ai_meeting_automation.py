@@ -1,40 +1,48 @@
 import os
 import re
+import base64
 import json
+import time
+import atexit
+import asyncio
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
 from email.mime.text import MimeText
 from email.mime.multipart import MimeMultipart
 import requests
+import httpx
+import orjson
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-import pickle
 from dotenv import load_dotenv
 
 load_dotenv()
 
-class GeminiAI:
-    """Gemini AI client for email analysis and meeting decision making."""
-    
-    def __init__(self, api_key: str):
-        self.api_key = api_key
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
-    
-    def analyze_email(self, email_content: str, subject: str, sender: str, recipients: List[str]) -> Dict:
-        """
-        Analyze email content to determine if a meeting should be created.
-        Returns structured data about the meeting requirements.
-        """
-        prompt = f"""
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+_JSON_DECODER = json.JSONDecoder()
+
+# Days from each weekday (Mon..Sun) to the next business day
+_NEXT_BIZ_OFFSET = (1, 1, 1, 1, 3, 2, 1)
+
+# Gemini analysis prompt; literal JSON braces are doubled for str.format_map
+_PROMPT_TEMPLATE = """
         Analyze the following email and determine if it requires creating a Google Meet:
 
         Subject: {subject}
         Sender: {sender}
-        Recipients: {', '.join(recipients)}
-        Content: {email_content}
+        Recipients: {recipients}
+        Content: {content}
 
         Please analyze and return a JSON response with the following structure:
         {{
@@ -68,42 +76,94 @@ class GeminiAI:
         - Simple confirmations
         """
 
-        headers = {
-            "Content-Type": "application/json",
-        }
+# Cheap pre-filter: emails rejected here never reach Gemini
+_SKIP_SENDER = re.compile(r'(noreply|no-reply|notifications?@|donotreply)', re.I)
+_SKIP_SUBJECT = re.compile(r'(unsubscribe|receipt|invoice|password reset|out of office)', re.I)
+_MEETING_HINT = re.compile(r'\b(meeting|call|sync|standup|discuss|schedule|catch up)\b', re.I)
+
+def _extract_json(text: str) -> Dict:
+    """Decode the first JSON object in text, ignoring any prose around it."""
+    start = text.find('{')
+    if start < 0:
+        raise ValueError("No valid JSON found in AI response")
+    obj, _ = _JSON_DECODER.raw_decode(text, start)
+    return obj
+
+class GeminiAI:
+    """Gemini AI client for email analysis and meeting decision making."""
+    
+    def __init__(self, api_key: str, session: Optional[requests.Session] = None):
+        self.api_key = api_key
+        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
+        # Keep one pooled connection so repeated calls skip the TCP/TLS handshake
+        self.session = session or requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+    
+    def analyze_email(self, email_content: str, subject: str, sender: str, recipients: List[str]) -> Dict:
+        """
+        Analyze email content to determine if a meeting should be created.
+        Returns structured data about the meeting requirements.
+        """
+        data = self._build_request(email_content, subject, sender, recipients)
         
-        data = {
-            "contents": [{
-                "parts": [{
-                    "text": prompt
-                }]
-            }]
-        }
+        try:
+            response = self.session.post(
+                f"{self.base_url}?key={self.api_key}",
+                data=orjson.dumps(data),
+                timeout=30
+            )
+            response.raise_for_status()
+            return self._parse_response(orjson.loads(response.content))
+                
+        except Exception as e:
+            return self._error_result(e)
+    
+    async def analyze_email_async(self, client: httpx.AsyncClient, email_content: str, subject: str,
+                                  sender: str, recipients: List[str]) -> Dict:
+        """Async variant of analyze_email that issues the request on a shared httpx client."""
+        data = self._build_request(email_content, subject, sender, recipients)
         
         try:
-            response = requests.post(
+            response = await client.post(
                 f"{self.base_url}?key={self.api_key}",
-                headers=headers,
-                json=data
+                content=orjson.dumps(data),
+                headers={"Content-Type": "application/json"}
             )
             response.raise_for_status()
-            
-            result = response.json()
-            content = result['candidates'][0]['content']['parts'][0]['text']
-            
-            # Extract JSON from the response
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-            else:
-                raise ValueError("No valid JSON found in AI response")
+            return self._parse_response(orjson.loads(response.content))
                 
         except Exception as e:
-            print(f"Error calling Gemini AI: {e}")
-            return {
-                "requires_meeting": False,
-                "error": str(e)
-            }
+            return self._error_result(e)
+    
+    def _build_request(self, email_content: str, subject: str, sender: str, recipients: List[str]) -> Dict:
+        """Build the Gemini request payload for an email."""
+        prompt = _PROMPT_TEMPLATE.format_map({
+            'subject': subject,
+            'sender': sender,
+            'recipients': ', '.join(recipients),
+            'content': email_content
+        })
+
+        return {
+            "contents": [{
+                "parts": [{
+                    "text": prompt
+                }]
+            }]
+        }
+    
+    def _parse_response(self, result: Dict) -> Dict:
+        """Extract the meeting analysis JSON from a Gemini response."""
+        content = result['candidates'][0]['content']['parts'][0]['text']
+        return _extract_json(content)
+    
+    def _error_result(self, error: Exception) -> Dict:
+        """Fallback analysis returned when the Gemini call fails."""
+        print(f"Error calling Gemini AI: {error}")
+        return {
+            "requires_meeting": False,
+            "error": str(error)
+        }
 
 class GoogleCalendarManager:
     """Manages Google Calendar and Meet operations."""
@@ -112,21 +172,31 @@ class GoogleCalendarManager:
         'https://www.googleapis.com/auth/calendar',
         'https://www.googleapis.com/auth/gmail.readonly'
     ]
+    GMAIL_BATCH_SIZE = 100  # Gmail API maximum calls per batch request
+    EMAIL_HEADER_FIELDS = {
+        'subject': 'subject',
+        'sender': 'from',
+        'to': 'to',
+        'cc': 'cc',
+        'date': 'date'
+    }
     
     def __init__(self, credentials_path: str):
         self.credentials_path = credentials_path
         self.creds = None
         self.calendar_service = None
         self.gmail_service = None
+        # Mailbox history id covering everything returned by the last get_recent_emails call,
+        # or None if that call may have left messages behind
+        self.latest_history_id = None
         self._authenticate()
     
     def _authenticate(self):
         """Authenticate with Google APIs."""
-        token_path = 'token.pickle'
+        token_path = 'token.json'
         
         if os.path.exists(token_path):
-            with open(token_path, 'rb') as token:
-                self.creds = pickle.load(token)
+            self.creds = Credentials.from_authorized_user_file(token_path, self.SCOPES)
         
         if not self.creds or not self.creds.valid:
             if self.creds and self.creds.expired and self.creds.refresh_token:
@@ -136,8 +206,8 @@ class GoogleCalendarManager:
                     self.credentials_path, self.SCOPES)
                 self.creds = flow.run_local_server(port=0)
             
-            with open(token_path, 'wb') as token:
-                pickle.dump(self.creds, token)
+            with open(token_path, 'w') as token:
+                token.write(self.creds.to_json())
         
         self.calendar_service = build('calendar', 'v3', credentials=self.creds)
         self.gmail_service = build('gmail', 'v1', credentials=self.creds)
@@ -214,35 +284,69 @@ class GoogleCalendarManager:
     def _get_next_business_day_time(self) -> datetime:
         """Get next business day at 2 PM."""
         now = datetime.now()
-        days_ahead = 1
-        
-        # Find next weekday
-        while (now + timedelta(days=days_ahead)).weekday() > 4:  # 0-4 are Mon-Fri
-            days_ahead += 1
-        
-        next_day = now + timedelta(days=days_ahead)
+        next_day = now + timedelta(days=_NEXT_BIZ_OFFSET[now.weekday()])
         return next_day.replace(hour=14, minute=0, second=0, microsecond=0)
     
-    def get_recent_emails(self, max_results: int = 10) -> List[Dict]:
-        """Get recent emails for processing."""
+    def get_recent_emails(self, max_results: int = 10, start_history_id: Optional[int] = None,
+                          skip_ids=frozenset()) -> List[Dict]:
+        """
+        Get recent emails for processing.
+        When start_history_id is given, only messages added since that point are fetched.
+        Ids in skip_ids (already handled) are dropped before max_results is applied.
+        """
+        self.latest_history_id = None
         try:
-            results = self.gmail_service.users().messages().list(
-                userId='me',
-                maxResults=max_results,
-                q='is:unread'  # Only unread emails
-            ).execute()
+            messages = None
+            history_id = None
+            if start_history_id:
+                delta = self._get_messages_since(start_history_id, max_results, skip_ids)
+                if delta is not None:
+                    messages, history_id = delta
+            
+            if messages is None:
+                # Read the cursor before listing so nothing added in between is skipped later.
+                # Unread mail older than the newest max_results isn't revisited; later runs
+                # only follow the history from here
+                history_id = int(self.gmail_service.users().getProfile(userId='me').execute()['historyId'])
+                results = self.gmail_service.users().messages().list(
+                    userId='me',
+                    maxResults=max_results,
+                    q='is:unread'  # Only unread emails
+                ).execute()
+                messages = [m for m in results.get('messages', []) if m['id'] not in skip_ids]
             
-            messages = results.get('messages', [])
             emails = []
+            fetched = {}
+            
+            def store_message(request_id, response, exception):
+                if exception is not None:
+                    print(f'An error occurred fetching message {request_id}: {exception}')
+                else:
+                    fetched[request_id] = response
+            
+            # Fetch message bodies in batched HTTP requests instead of one round-trip each
+            for start in range(0, len(messages), self.GMAIL_BATCH_SIZE):
+                batch = self.gmail_service.new_batch_http_request(callback=store_message)
+                for message in messages[start:start + self.GMAIL_BATCH_SIZE]:
+                    batch.add(
+                        self.gmail_service.users().messages().get(
+                            userId='me',
+                            id=message['id'],
+                            format='full'
+                        ),
+                        request_id=message['id']
+                    )
+                batch.execute()
             
             for message in messages:
-                msg = self.gmail_service.users().messages().get(
-                    userId='me',
-                    id=message['id']
-                ).execute()
+                msg = fetched.get(message['id'])
+                if msg is None:
+                    # Couldn't fetch it this time, so don't move the cursor past it
+                    history_id = None
+                    continue
                 
                 payload = msg['payload']
-                headers = payload.get('headers', [])
+                header_map = {h['name'].lower(): h['value'] for h in payload.get('headers', [])}
                 
                 # Extract email metadata
                 email_data = {
@@ -250,88 +354,250 @@ class GoogleCalendarManager:
                     'thread_id': msg['threadId'],
                     'snippet': msg['snippet']
                 }
-                
-                for header in headers:
-                    name = header['name'].lower()
-                    if name == 'subject':
-                        email_data['subject'] = header['value']
-                    elif name == 'from':
-                        email_data['sender'] = header['value']
-                    elif name == 'to':
-                        email_data['to'] = header['value']
-                    elif name == 'cc':
-                        email_data['cc'] = header['value']
-                    elif name == 'date':
-                        email_data['date'] = header['value']
+                email_data.update({
+                    field: header_map[name]
+                    for field, name in self.EMAIL_HEADER_FIELDS.items()
+                    if name in header_map
+                })
                 
                 # Get email body
                 email_data['body'] = self._extract_email_body(payload)
                 emails.append(email_data)
             
+            self.latest_history_id = history_id
             return emails
             
         except HttpError as error:
             print(f'An error occurred: {error}')
             return []
     
-    def _extract_email_body(self, payload) -> str:
-        """Extract email body from payload."""
-        body = ""
+    def _get_messages_since(self, start_history_id: int, max_results: int,
+                            skip_ids=frozenset()) -> Optional[Tuple[List[Dict], int]]:
+        """
+        List unread inbox messages added since start_history_id via the Gmail history API.
+        Returns (messages, history_id), where history_id is where the next listing should
+        start: the mailbox's current history id, or the id of the last history record taken
+        if the listing stopped at max_results.
+        Returns None if the history id has expired and a full listing is required.
+        """
+        messages = []
+        page_token = None
+        history_id = start_history_id
         
-        if 'parts' in payload:
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/plain':
-                    data = part['body']['data']
-                    body = self._decode_base64(data)
+        try:
+            while True:
+                response = self.gmail_service.users().history().list(
+                    userId='me',
+                    startHistoryId=start_history_id,
+                    historyTypes=['messageAdded'],
+                    labelId='INBOX',  # Same scope as messages.list: no spam or trash
+                    pageToken=page_token
+                ).execute()
+                history_id = int(response['historyId'])
+                
+                for record in response.get('history', []):
+                    for added in record.get('messagesAdded', []):
+                        message = added['message']
+                        if 'UNREAD' in message.get('labelIds', []) and message['id'] not in skip_ids:
+                            messages.append({'id': message['id']})
+                    if len(messages) >= max_results:
+                        # Later records wait for the next run, which resumes after this one
+                        return messages, int(record['id'])
+                
+                page_token = response.get('nextPageToken')
+                if not page_token:
                     break
-        else:
-            if payload['mimeType'] == 'text/plain':
-                data = payload['body']['data']
-                body = self._decode_base64(data)
+        except HttpError as error:
+            if error.resp.status == 404:
+                return None
+            raise
         
-        return body
+        return messages, history_id
+    
+    def _extract_email_body(self, payload) -> str:
+        """Extract the first text/plain body from payload, including nested multiparts."""
+        stack = [payload]
+        
+        while stack:
+            part = stack.pop()
+            if part.get('mimeType') == 'text/plain' and 'data' in part.get('body', {}):
+                return self._decode_base64(part['body']['data'])
+            # Reverse so parts are visited in document order
+            stack.extend(reversed(part.get('parts', [])))
+        
+        return ""
     
     def _decode_base64(self, data: str) -> str:
         """Decode base64 encoded email content."""
-        import base64
-        return base64.urlsafe_b64decode(data).decode('utf-8')
+        return base64.urlsafe_b64decode(data).decode('utf-8', errors='replace')
 
 class EmailProcessor:
     """Main email processing and automation class."""
     
+    STATE_PATH = '.meeting_state.json'
+    CLAIM_TTL = 15 * 60  # seconds before a crashed worker's claimed emails are offered again
+    MAX_CONCURRENT_ANALYSES = 10  # Keep in-flight Gemini requests within quota
+    
     def __init__(self):
         self.gemini = GeminiAI(os.getenv('GEMINI_API_KEY'))
         self.calendar_manager = GoogleCalendarManager(os.getenv('GOOGLE_CREDENTIALS_PATH'))
         self.processed_emails = set()
+        self.history_id = None
+        self._state_dirty = False
+        with self._state_lock():
+            self._load_state()
+        atexit.register(self._save_state)
+    
+    @contextmanager
+    def _state_lock(self):
+        """
+        Hold an exclusive lock on the state file.
+        Several processes (e.g. prefork Celery workers) may share it.
+        """
+        with open(f"{self.STATE_PATH}.lock", 'a+') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+    
+    def _read_state(self) -> Dict:
+        """Read the state file; callers must hold the state lock."""
+        if not os.path.exists(self.STATE_PATH):
+            return {}
+        
+        try:
+            with open(self.STATE_PATH, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not load state from {self.STATE_PATH}: {e}")
+            return {}
+    
+    def _load_state(self):
+        """Refresh processed email ids and the last seen Gmail history id from disk."""
+        state = self._read_state()
+        self.processed_emails.update(state.get('seen', []))
+        if state.get('history_id') is not None:
+            self.history_id = state['history_id']
+    
+    def _write_state(self, claim=(), release=()):
+        """
+        Merge our state into the state file, adding claims on the email ids in claim and
+        dropping ours on those in release; callers must hold the state lock.
+        """
+        if not (self._state_dirty or claim or release):
+            return
+        
+        # Another process may have saved since we loaded, so keep its progress too
+        state = self._read_state()
+        self.processed_emails.update(state.get('seen', []))
+        if state.get('history_id') is not None:
+            self.history_id = max(self.history_id or 0, state['history_id'])
+        
+        now = time.time()
+        claimed = {email_id: expires for email_id, expires in state.get('claimed', {}).items()
+                   if expires > now and email_id not in release}
+        claimed.update(dict.fromkeys(claim, now + self.CLAIM_TTL))
+        
+        state = {'history_id': self.history_id, 'seen': sorted(self.processed_emails), 'claimed': claimed}
+        tmp_path = f"{self.STATE_PATH}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.STATE_PATH)
+        self._state_dirty = False
+    
+    def _save_state(self):
+        """Persist processed email ids and history id if they changed."""
+        with self._state_lock():
+            self._write_state()
     
     def process_emails(self) -> List[Dict]:
         """Process recent emails and create meetings as needed."""
+        with self._state_lock():
+            self._load_state()
+        
         emails = self.calendar_manager.get_recent_emails(
-            max_results=int(os.getenv('MAX_EMAILS_PER_CHECK', 50))
+            max_results=int(os.getenv('MAX_EMAILS_PER_CHECK', 50)),
+            start_history_id=self.history_id,
+            skip_ids=self.processed_emails
         )
+        latest_history_id = self.calendar_manager.latest_history_id
         
-        results = []
+        # Claim the emails under the lock, then release it for the Gemini/Calendar work so
+        # concurrent workers split new mail between them instead of queueing on the lock
+        with self._state_lock():
+            claimed, contended = self._claim_emails(emails)
+            self._write_state(claim=[email['id'] for email in claimed])
+        
+        all_handled = False
+        try:
+            results, all_handled = self._process_emails(claimed)
+            return results
+        finally:
+            with self._state_lock():
+                # Only advance the history cursor once every email it covers has been handled,
+                # including those another worker had claimed
+                if (all_handled and not contended and latest_history_id is not None
+                        and latest_history_id != self.history_id):
+                    self.history_id = latest_history_id
+                    self._state_dirty = True
+                self._write_state(release=[email['id'] for email in claimed])
+    
+    def _claim_emails(self, emails: List[Dict]) -> Tuple[List[Dict], bool]:
+        """
+        Pick the emails not yet handled or claimed by another worker; callers must hold the state lock.
+        Returns those emails and whether any were skipped because another worker holds them.
+        """
+        state = self._read_state()
+        self.processed_emails.update(state.get('seen', []))
+        now = time.time()
+        taken = {email_id for email_id, expires in state.get('claimed', {}).items() if expires > now}
         
+        unhandled = [email for email in emails if email['id'] not in self.processed_emails]
+        claimed = [email for email in unhandled if email['id'] not in taken]
+        return claimed, len(claimed) < len(unhandled)
+    
+    def _process_emails(self, emails: List[Dict]) -> Tuple[List[Dict], bool]:
+        """Analyze and act on claimed emails; returns the results and whether all were handled."""
+        all_handled = True
+        
+        results = []
+        pending = []
         for email in emails:
-            if email['id'] in self.processed_emails:
+            skip_reason = self._prefilter(email)
+            if skip_reason:
+                results.append({
+                    'email_id': email['id'],
+                    'subject': email.get('subject', ''),
+                    'sender': email.get('sender', ''),
+                    'analysis': {'requires_meeting': False, 'skip_reason': skip_reason},
+                    'meeting_created': False
+                })
+                self.processed_emails.add(email['id'])
+                self._state_dirty = True
                 continue
             
+            # Extract recipients
+            recipients = []
+            if email.get('to'):
+                recipients.extend(self._extract_emails(email['to']))
+            if email.get('cc'):
+                recipients.extend(self._extract_emails(email['cc']))
+            pending.append((email, recipients))
+        
+        # Analyze emails with AI concurrently; meeting creation below stays serial
+        analyses = asyncio.run(self._analyze_emails(pending)) if pending else []
+        
+        for (email, recipients), analysis in zip(pending, analyses):
             try:
-                # Extract recipients
-                recipients = []
-                if email.get('to'):
-                    recipients.extend(self._extract_emails(email['to']))
-                if email.get('cc'):
-                    recipients.extend(self._extract_emails(email['cc']))
-                
-                # Analyze email with AI
-                analysis = self.gemini.analyze_email(
-                    email_content=email.get('body', ''),
-                    subject=email.get('subject', ''),
-                    sender=email.get('sender', ''),
-                    recipients=recipients
-                )
-                
                 result = {
                     'email_id': email['id'],
                     'subject': email.get('subject', ''),
@@ -347,23 +613,57 @@ class EmailProcessor:
                     result['meeting_created'] = meeting_result.get('success', False)
                 
                 results.append(result)
-                self.processed_emails.add(email['id'])
+                if 'error' in analysis:
+                    # Gemini call failed (timeout, quota...); leave the email for the next run
+                    all_handled = False
+                else:
+                    self.processed_emails.add(email['id'])
+                    self._state_dirty = True
                 
             except Exception as e:
                 print(f"Error processing email {email['id']}: {e}")
+                all_handled = False
                 results.append({
                     'email_id': email['id'],
                     'error': str(e),
                     'meeting_created': False
                 })
         
-        return results
+        return results, all_handled
+    
+    def _prefilter(self, email: Dict) -> Optional[str]:
+        """Return why an email can be rejected without the AI, or None if it needs analysis."""
+        sender = email.get('sender', '')
+        subject = email.get('subject', '')
+        
+        if _SKIP_SENDER.search(sender):
+            return 'automated sender'
+        if _SKIP_SUBJECT.search(subject):
+            return 'non-meeting subject'
+        if not _MEETING_HINT.search(f"{subject} {email.get('body', '')}"):
+            return 'no meeting keywords'
+        return None
+    
+    async def _analyze_emails(self, pending: List[Tuple[Dict, List[str]]]) -> List[Dict]:
+        """Run Gemini analysis for each (email, recipients) pair, bounded by MAX_CONCURRENT_ANALYSES."""
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_ANALYSES)
+        
+        async with httpx.AsyncClient(timeout=30) as client:
+            async def analyze(email: Dict, recipients: List[str]) -> Dict:
+                async with semaphore:
+                    return await self.gemini.analyze_email_async(
+                        client,
+                        email_content=email.get('body', ''),
+                        subject=email.get('subject', ''),
+                        sender=email.get('sender', ''),
+                        recipients=recipients
+                    )
+            
+            return await asyncio.gather(*(analyze(email, recipients) for email, recipients in pending))
     
     def _extract_emails(self, email_string: str) -> List[str]:
         """Extract email addresses from a string."""
-        import re
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        return re.findall(email_pattern, email_string)
+        return _EMAIL_RE.findall(email_string)
 
 if __name__ == "__main__":
     processor = EmailProcessor()
@@ -1,21 +1,53 @@
 """
 Simple web dashboard for monitoring the AI Meeting Automation system.
-Run with: python dashboard.py
+Run with: python dashboard.py (development server)
+Production: gunicorn -w 4 -k gthread --threads 8 -b 0.0.0.0:5000 wsgi:application
+Automation runs are executed by a Celery worker:
+    celery -A dashboard.celery worker -c 4
 """
 
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template, jsonify, request, g, current_app, Response
 import json
+import hashlib
 import os
+import threading
 from datetime import datetime, timedelta
 import sqlite3
+import redis
+from flask_compress import Compress
+from celery import Celery
+from celery.result import AsyncResult
+from celery.signals import worker_init
+from google.auth.exceptions import RefreshError
 from ai_meeting_automation import EmailProcessor
 
 app = Flask(__name__)
+app.config['DB_PATH'] = 'automation_stats.db'
+# Gzip the page and JSON; the event stream is left out so pushes aren't buffered
+app.config['COMPRESS_MIMETYPES'] = ['text/html', 'application/json']
+app.config['COMPRESS_LEVEL'] = 6
+app.config['COMPRESS_MIN_SIZE'] = 500
+Compress(app)
+
+celery = Celery(
+    'automation',
+    broker=os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0'),
+    backend=os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/1')
+)
+
+# Stats updates are pushed to open dashboards over this pub/sub channel
+STATS_CHANNEL = 'stats'
+redis_client = redis.Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
 
 # Simple database for tracking statistics
 def init_db():
-    conn = sqlite3.connect('automation_stats.db')
+    conn = sqlite3.connect(app.config['DB_PATH'])
     c = conn.cursor()
+    # WAL lets /api/stats read while a run is writing; the mode persists in the db file
+    c.execute('PRAGMA journal_mode=WAL')
+    c.execute('PRAGMA synchronous=NORMAL')
+    c.execute('PRAGMA wal_autocheckpoint=1000')
+    c.execute('PRAGMA busy_timeout=5000')
     c.execute('''
         CREATE TABLE IF NOT EXISTS email_stats (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -25,140 +57,89 @@ def init_db():
             total_emails INTEGER
         )
     ''')
+    # Single-row running totals, kept in step with email_stats so polls avoid SUM() scans
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS stats_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            emails_processed INTEGER DEFAULT 0,
+            meetings_created INTEGER DEFAULT 0,
+            total_emails INTEGER DEFAULT 0,
+            last_run DATETIME
+        )
+    ''')
+    # Seed from any existing history the first time the table is created
+    c.execute('''
+        INSERT OR IGNORE INTO stats_totals (id, emails_processed, meetings_created, total_emails, last_run)
+        SELECT 1, COALESCE(SUM(emails_processed), 0), COALESCE(SUM(meetings_created), 0),
+               COALESCE(SUM(total_emails), 0), MAX(timestamp)
+        FROM email_stats
+    ''')
     conn.commit()
     conn.close()
 
+def get_db():
+    """Return the stats connection for the current app context, opening it on first use."""
+    if 'db' not in g:
+        g.db = sqlite3.connect(current_app.config['DB_PATH'], check_same_thread=False, isolation_level=None)
+        g.db.row_factory = sqlite3.Row
+        g.db.execute('PRAGMA synchronous=NORMAL')
+        g.db.execute('PRAGMA busy_timeout=5000')
+    return g.db
+
+@app.teardown_appcontext
+def close_db(exception):
+    """Close the stats connection when the app context ends."""
+    db = g.pop('db', None)
+    if db is not None:
+        db.close()
+
+@worker_init.connect
+def init_worker_db(**kwargs):
+    """Make sure the stats table exists before a worker writes to it."""
+    init_db()
+
 @app.route('/')
 def dashboard():
-    return '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>AI Meeting Automation Dashboard</title>
-        <style>
-            body { font-family: Arial, sans-serif; margin: 20px; background: #f5f5f5; }
-            .container { max-width: 1200px; margin: 0 auto; }
-            .card { background: white; padding: 20px; margin: 10px 0; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
-            .header { text-align: center; color: #333; }
-            .stats { display: grid; grid-template-columns: repeat(auto-fit, minmax(250px, 1fr)); gap: 20px; }
-            .stat-card { text-align: center; }
-            .stat-number { font-size: 2em; font-weight: bold; color: #4CAF50; }
-            .stat-label { color: #666; margin-top: 5px; }
-            .recent-activity { margin-top: 20px; }
-            .activity-item { padding: 10px; border-left: 4px solid #4CAF50; margin: 10px 0; background: #f9f9f9; }
-            .status { padding: 5px 10px; border-radius: 4px; font-size: 0.9em; }
-            .status.success { background: #d4edda; color: #155724; }
-            .status.info { background: #d1ecf1; color: #0c5460; }
-            .refresh-btn { background: #4CAF50; color: white; padding: 10px 20px; border: none; border-radius: 4px; cursor: pointer; }
-        </style>
-        <script>
-            function refreshData() {
-                fetch('/api/stats')
-                    .then(response => response.json())
-                    .then(data => {
-                        document.getElementById('total-emails').textContent = data.total_emails;
-                        document.getElementById('meetings-created').textContent = data.meetings_created;
-                        document.getElementById('success-rate').textContent = data.success_rate + '%';
-                        document.getElementById('last-run').textContent = data.last_run;
-                    });
-            }
-            
-            function runAutomation() {
-                document.getElementById('status').innerHTML = '<span class="status info">Running automation...</span>';
-                fetch('/api/run')
-                    .then(response => response.json())
-                    .then(data => {
-                        if (data.success) {
-                            document.getElementById('status').innerHTML = '<span class="status success">Automation completed successfully</span>';
-                            refreshData();
-                        } else {
-                            document.getElementById('status').innerHTML = '<span class="status error">Error: ' + data.error + '</span>';
-                        }
-                    });
-            }
-            
-            setInterval(refreshData, 30000); // Refresh every 30 seconds
-        </script>
-    </head>
-    <body>
-        <div class="container">
-            <div class="card">
-                <h1 class="header">🤖 AI Meeting Automation Dashboard</h1>
-                <p style="text-align: center; color: #666;">Monitor your intelligent email-to-meeting automation</p>
-            </div>
-            
-            <div class="stats">
-                <div class="card stat-card">
-                    <div class="stat-number" id="total-emails">0</div>
-                    <div class="stat-label">Emails Processed</div>
-                </div>
-                <div class="card stat-card">
-                    <div class="stat-number" id="meetings-created">0</div>
-                    <div class="stat-label">Meetings Created</div>
-                </div>
-                <div class="card stat-card">
-                    <div class="stat-number" id="success-rate">0</div>
-                    <div class="stat-label">Success Rate</div>
-                </div>
-                <div class="card stat-card">
-                    <div class="stat-number" id="last-run">Never</div>
-                    <div class="stat-label">Last Run</div>
-                </div>
-            </div>
-            
-            <div class="card">
-                <h3>Quick Actions</h3>
-                <button class="refresh-btn" onclick="runAutomation()">🚀 Run Automation Now</button>
-                <button class="refresh-btn" onclick="refreshData()" style="background: #2196F3; margin-left: 10px;">🔄 Refresh Data</button>
-                <div id="status" style="margin-top: 10px;"></div>
-            </div>
-            
-            <div class="card recent-activity">
-                <h3>Recent Activity</h3>
-                <div id="activity-list">
-                    <div class="activity-item">
-                        <strong>System started</strong><br>
-                        <small>Dashboard initialized and ready for monitoring</small>
-                    </div>
-                </div>
-            </div>
-        </div>
-        
-        <script>
-            // Initial data load
-            refreshData();
-        </script>
-    </body>
-    </html>
-    '''
+    # Served from disk with a file-based ETag; behind nginx this route is never reached
+    response = app.send_static_file('index.html')
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
+
+def current_stats(conn):
+    """Read the running totals and shape them for the dashboard."""
+    _, meetings_created, total_emails, last_run = conn.execute(
+        'SELECT emails_processed, meetings_created, total_emails, last_run FROM stats_totals WHERE id = 1'
+    ).fetchone()
+    
+    total_emails = total_emails or 0
+    meetings_created = meetings_created or 0
+    success_rate = round((meetings_created / total_emails * 100) if total_emails > 0 else 0, 1)
+    
+    return {
+        'total_emails': total_emails,
+        'meetings_created': meetings_created,
+        'success_rate': success_rate,
+        'last_run': last_run or 'Never'
+    }
 
 @app.route('/api/stats')
 def get_stats():
     """Get automation statistics."""
     try:
-        conn = sqlite3.connect('automation_stats.db')
-        c = conn.cursor()
-        
-        # Get total stats
-        c.execute('SELECT SUM(emails_processed), SUM(meetings_created), SUM(total_emails) FROM email_stats')
-        totals = c.fetchone()
+        c = get_db().cursor()
         
-        # Get last run time
-        c.execute('SELECT timestamp FROM email_stats ORDER BY timestamp DESC LIMIT 1')
-        last_run = c.fetchone()
+        # Stats only change when a run is recorded, so the newest row identifies the payload.
+        # AUTOINCREMENT ids only grow, so MAX(id) finds it via the primary key without a scan
+        c.execute('SELECT id, timestamp FROM email_stats WHERE id = (SELECT MAX(id) FROM email_stats)')
+        max_id, max_ts = c.fetchone() or (None, None)
+        etag = '"' + hashlib.md5(f"{max_id}:{max_ts}".encode()).hexdigest() + '"'
+        if request.headers.get('If-None-Match') == etag:
+            return '', 304
         
-        conn.close()
-        
-        total_emails = totals[2] or 0
-        meetings_created = totals[1] or 0
-        success_rate = round((meetings_created / total_emails * 100) if total_emails > 0 else 0, 1)
-        
-        return jsonify({
-            'total_emails': total_emails,
-            'meetings_created': meetings_created,
-            'success_rate': success_rate,
-            'last_run': last_run[0] if last_run else 'Never'
-        })
+        response = jsonify(current_stats(get_db()))
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'private, max-age=5'
+        return response
         
     except Exception as e:
         return jsonify({
@@ -169,29 +150,117 @@ def get_stats():
             'error': str(e)
         })
 
+@app.route('/api/stats/stream')
+def stream_stats():
+    """
+    Server-sent events: the current stats, then a new snapshot each time a run is recorded.
+    Each open stream occupies a gthread worker thread for as long as the tab stays open,
+    so the open dashboards plus in-flight requests must fit in workers x threads.
+    """
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(STATS_CHANNEL)
+    initial = json.dumps(current_stats(get_db()))
+    
+    def generate():
+        try:
+            yield f"data: {initial}\n\n"
+            while True:
+                message = pubsub.get_message(timeout=15)
+                if message is None:
+                    # Comment line keeps proxies from timing out and surfaces closed clients
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"data: {message['data'].decode()}\n\n"
+        finally:
+            pubsub.close()
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _write_stats(conn, emails_processed, meetings_created):
+    """Insert one run's stats row and bump the running totals in a single transaction."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('INSERT INTO email_stats (emails_processed, meetings_created, total_emails) VALUES (?, ?, ?)',
+                     (emails_processed, meetings_created, emails_processed))
+        conn.execute('''
+            UPDATE stats_totals
+            SET emails_processed = emails_processed + ?, meetings_created = meetings_created + ?,
+                total_emails = total_emails + ?, last_run = CURRENT_TIMESTAMP
+            WHERE id = 1
+        ''', (emails_processed, meetings_created, emails_processed))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+def record_run_stats(emails_processed, meetings_created):
+    """Write one run's stats, then push the new totals to open dashboards."""
+    conn = sqlite3.connect(app.config['DB_PATH'], isolation_level=None)
+    try:
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        _write_stats(conn, emails_processed, meetings_created)
+        stats = current_stats(conn)
+    finally:
+        conn.close()
+    
+    try:
+        redis_client.publish(STATS_CHANNEL, json.dumps(stats))
+    except redis.RedisError as e:
+        # The row is saved; dashboards just miss the live update until they reload
+        print(f"Error publishing automation stats: {e}")
+
+# Building an EmailProcessor authenticates and loads the Google API clients, so each
+# process keeps one and reuses it across runs
+_processor = None
+_processor_lock = threading.Lock()
+
+def get_processor():
+    """Return this process's shared EmailProcessor, creating it on first use."""
+    global _processor
+    if _processor is None:
+        with _processor_lock:
+            if _processor is None:
+                _processor = EmailProcessor()
+    return _processor
+
+def reset_processor():
+    """Drop the shared EmailProcessor so the next run re-authenticates."""
+    global _processor
+    with _processor_lock:
+        _processor = None
+
+@celery.task(bind=True, autoretry_for=(Exception,), retry_backoff=True, max_retries=3)
+def run_automation_task(self):
+    """Process emails and record the run in the stats table."""
+    try:
+        results = get_processor().process_emails()
+    except RefreshError:
+        # Stored credentials were revoked or expired; rebuild once with fresh auth
+        reset_processor()
+        results = get_processor().process_emails()
+    
+    # Save stats
+    emails_processed = len(results)
+    meetings_created = sum(1 for r in results if r.get('meeting_created'))
+    
+    record_run_stats(emails_processed, meetings_created)
+    
+    return {
+        'emails_processed': emails_processed,
+        'meetings_created': meetings_created,
+        'results': results[:5]  # Return first 5 results
+    }
+
 @app.route('/api/run')
 def run_automation():
-    """Manually trigger the automation."""
+    """Queue an automation run and return its task id."""
     try:
-        processor = EmailProcessor()
-        results = processor.process_emails()
-        
-        # Save stats
-        emails_processed = len(results)
-        meetings_created = sum(1 for r in results if r.get('meeting_created'))
-        
-        conn = sqlite3.connect('automation_stats.db')
-        c = conn.cursor()
-        c.execute('INSERT INTO email_stats (emails_processed, meetings_created, total_emails) VALUES (?, ?, ?)',
-                  (emails_processed, meetings_created, emails_processed))
-        conn.commit()
-        conn.close()
-        
+        task = run_automation_task.delay()
         return jsonify({
             'success': True,
-            'emails_processed': emails_processed,
-            'meetings_created': meetings_created,
-            'results': results[:5]  # Return first 5 results
+            'task_id': task.id
         })
         
     except Exception as e:
@@ -200,9 +269,33 @@ def run_automation():
             'error': str(e)
         })
 
+@app.route('/api/run/<task_id>')
+def run_status(task_id):
+    """Report the state of a queued automation run."""
+    try:
+        result = AsyncResult(task_id, app=celery)
+        response = {'task_id': task_id, 'state': result.state}
+        
+        if result.successful():
+            response.update(result.result)
+        elif result.failed():
+            response['error'] = str(result.result)
+        
+        return jsonify(response)
+        
+    except Exception as e:
+        # Result backend unreachable or the stored result couldn't be decoded
+        return jsonify({
+            'task_id': task_id,
+            'state': 'UNKNOWN',
+            'error': str(e)
+        })
+
 if __name__ == '__main__':
     init_db()
     print("🚀 Starting AI Meeting Automation Dashboard...")
     print("📊 Dashboard: http://localhost:5000")
     print("🔧 n8n Interface: http://localhost:5678")
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Reloader and interactive debugger only in development; use wsgi.py with gunicorn in production
+    debug = os.getenv('FLASK_ENV') == 'development'
+    app.run(host='0.0.0.0', port=5000, debug=debug, use_reloader=debug)
@@ -6,9 +6,10 @@ Run this script first to set up authentication.
 
 import os
 import json
+import orjson
+from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-import pickle
 
 SCOPES = [
     'https://www.googleapis.com/auth/calendar',
@@ -34,9 +35,9 @@ def setup_google_credentials():
         return False
     
     creds = None
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
+    if os.path.exists('token.json'):
+        with open('token.json', 'rb') as token:
+            creds = Credentials.from_authorized_user_info(orjson.loads(token.read()), SCOPES)
     
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
@@ -46,8 +47,8 @@ def setup_google_credentials():
                 'credentials.json', SCOPES)
             creds = flow.run_local_server(port=0)
         
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
+        with open('token.json', 'w') as token:
+            token.write(creds.to_json())
     
     print("✓ Google API credentials set up successfully!")
     return True
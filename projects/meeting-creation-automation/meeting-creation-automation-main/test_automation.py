@@ -1,22 +1,41 @@
 # Test script to verify the automation works
 import os
+import io
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Shared keep-alive session so the Gemini checks reuse one TLS connection
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset(['GET', 'POST'])
+    )
+))
+
+REQUIRED_VARS = [
+    'GEMINI_API_KEY',
+    'GOOGLE_CREDENTIALS_PATH',
+    'EMAIL_ADDRESS'
+]
+
+# Placeholder values left over from .env.example count as unset
+SENTINELS = {var: f'your_{var.lower()}_here' for var in REQUIRED_VARS}
+
 def test_environment():
     """Test if all required environment variables are set."""
-    required_vars = [
-        'GEMINI_API_KEY',
-        'GOOGLE_CREDENTIALS_PATH',
-        'EMAIL_ADDRESS'
-    ]
-    
-    missing_vars = []
-    for var in required_vars:
-        if not os.getenv(var) or os.getenv(var) == f'your_{var.lower()}_here':
-            missing_vars.append(var)
+    missing_vars = [var for var in REQUIRED_VARS if os.getenv(var) in (None, '', SENTINELS[var])]
     
     if missing_vars:
         print(f"❌ Missing environment variables: {', '.join(missing_vars)}")
@@ -33,7 +52,7 @@ def test_google_credentials():
         print(f"❌ Google credentials file not found: {creds_path}")
         return False
     
-    if not os.path.exists('token.pickle'):
+    if not os.path.exists('token.json'):
         print("⚠️  No authentication token found. Run setup.py first.")
         return False
     
@@ -43,7 +62,6 @@ def test_google_credentials():
 def test_gemini_connection():
     """Test Gemini AI connection."""
     try:
-        import requests
         api_key = os.getenv('GEMINI_API_KEY')
         
         # Simple test request
@@ -57,7 +75,7 @@ def test_gemini_connection():
             }]
         }
         
-        response = requests.post(url, headers=headers, json=data, timeout=10)
+        response = _session.post(url, headers=headers, json=data, timeout=10)
         
         if response.status_code == 200:
             print("✓ Gemini AI connection successful")
@@ -75,7 +93,7 @@ def test_email_processing():
     try:
         from ai_meeting_automation import GeminiAI
         
-        gemini = GeminiAI(os.getenv('GEMINI_API_KEY'))
+        gemini = GeminiAI(os.getenv('GEMINI_API_KEY'), session=_session)
         
         # Test with a sample email
         test_email = """
@@ -108,6 +126,36 @@ def test_email_processing():
         print(f"❌ Email processing test failed: {e}")
         return False
 
+# Per-thread output capture so concurrently running tests don't interleave their prints
+_output = threading.local()
+
+class _ThreadLocalStdout:
+    """Send writes to the calling thread's capture buffer, if it has one."""
+    
+    def __init__(self, stream):
+        self._stream = stream
+    
+    def write(self, text):
+        return getattr(_output, 'buffer', self._stream).write(text)
+    
+    def flush(self):
+        getattr(_output, 'buffer', self._stream).flush()
+    
+    def __getattr__(self, name):
+        # encoding, isatty(), fileno() etc. come from the real stream
+        return getattr(self._stream, name)
+
+def _run_captured(test_func):
+    """Run a test in the current thread and return (passed, exception, printed output)."""
+    _output.buffer = io.StringIO()
+    try:
+        try:
+            return bool(test_func()), None, _output.buffer.getvalue()
+        except Exception as e:
+            return False, e, _output.buffer.getvalue()
+    finally:
+        del _output.buffer
+
 def main():
     """Run all tests."""
     print("=== AI Meeting Automation Test Suite ===\n")
@@ -122,14 +170,26 @@ def main():
     passed = 0
     total = len(tests)
     
-    for test_name, test_func in tests:
+    # The checks are independent and mostly network-bound, so run them concurrently
+    # and report in the original order once they finish
+    stdout = sys.stdout
+    sys.stdout = _ThreadLocalStdout(stdout)
+    try:
+        with ThreadPoolExecutor(max_workers=len(tests)) as executor:
+            futures = [executor.submit(_run_captured, test_func) for _, test_func in tests]
+            outcomes = [future.result() for future in futures]
+    finally:
+        sys.stdout = stdout
+    
+    for (test_name, _), (ok, error, output) in zip(tests, outcomes):
         print(f"Testing {test_name}...")
-        try:
-            if test_func():
-                passed += 1
-            print()
-        except Exception as e:
-            print(f"❌ {test_name} failed with exception: {e}\n")
+        print(output, end='')
+        if error is not None:
+            print(f"❌ {test_name} failed with exception: {error}\n")
+            continue
+        if ok:
+            passed += 1
+        print()
     
     print("=== Test Results ===")
     print(f"Passed: {passed}/{total}")
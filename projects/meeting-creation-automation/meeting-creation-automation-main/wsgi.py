@@ -0,0 +1,10 @@
+"""
+WSGI entry point for serving the dashboard in production.
+Run with: gunicorn -w 4 -k gthread --threads 8 -b 0.0.0.0:5000 wsgi:application
+"""
+
+from dashboard import app, init_db
+
+init_db()
+
+application = app